@@ -7,6 +7,9 @@ class DNN(nn.Module):
     def __init__(self, inputs_dim, hidden_units, activation=F.relu, l2_reg=0, dropout_rate=0, use_bn=False,
                  init_std=0.0001, seed=1024,device='cpu'):
         super(DNN, self).__init__()
+        if activation is F.relu:
+            # the Linear/BatchNorm output is not needed for backward, so ReLU can overwrite it
+            activation = nn.ReLU(inplace=True)
         self.activation = activation
         self.dropout_rate = dropout_rate
         self.dropout = nn.Dropout(dropout_rate)
@@ -51,6 +54,23 @@ class DNN(nn.Module):
             deep_input = fc
         return deep_input
 
+    def fuse_bn(self):
+        """Fold each BatchNorm into the preceding Linear so inference skips the normalization.
+        BatchNorm is a fixed affine transform only with its running statistics, so call it in eval mode.
+        """
+        if self.training:
+            raise ValueError("fuse_bn must be called in eval mode")
+        if not self.use_bn:
+            return self
+        with torch.no_grad():
+            for linear, bn in zip(self.linears, self.bn):
+                scale = bn.weight / torch.sqrt(bn.running_var + bn.eps)
+                linear.weight.mul_(scale.unsqueeze(1))
+                linear.bias.copy_((linear.bias - bn.running_mean) * scale + bn.bias)
+        self.use_bn = False
+        del self.bn
+        return self
+
 
 class PredictionLayer(nn.Module):
     """
@@ -70,7 +90,8 @@ class PredictionLayer(nn.Module):
             self.bias = nn.Parameter(torch.zeros((1,)))
 
     def forward(self, X):
-        output = X
+        # logits from reduced-precision (bfloat16) layers are finished in float32
+        output = X.float()
         if self.use_bias:
             output += self.bias
         if self.task == "binary":
@@ -1,9 +1,12 @@
 import itertools
+import math
 
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
+from .utils import register_index_buffer
+
 
 class FM(nn.Module):
     """Factorization Machine models pairwise (order-2) feature interactions
@@ -99,9 +102,9 @@ Tongwen](https://arxiv.org/pdf/1905.09433.pdf)
 class BilinearInteraction(nn.Module):
     """BilinearInteraction Layer used in FiBiNET.
       Input shape
-        - A list of 3D tensor with shape: ``(batch_size,filed_size, embedding_size)``.
-      Output shape
         - 3D tensor with shape: ``(batch_size,filed_size, embedding_size)``.
+      Output shape
+        - 3D tensor with shape: ``(batch_size,filed_size*(filed_size-1)/2, embedding_size)``.
       Arguments
         - **str** : String, types of bilinear functions used in this layer.
         - **seed** : A Python integer to use as random seed.
@@ -114,38 +117,46 @@ Tongwen](https://arxiv.org/pdf/1905.09433.pdf)
         super(BilinearInteraction, self).__init__()
         self.bilinear_type = bilinear_type
         self.seed = seed
-        self.bilinear = nn.ModuleList()
         if self.bilinear_type == "all":
             self.bilinear = nn.Linear(embedding_size, embedding_size, bias=False)
-        elif self.bilinear_type == "each":
-            for i in range(filed_size):
-                self.bilinear.append(
-                    nn.Linear(embedding_size, embedding_size, bias=False))
-        elif self.bilinear_type == "interaction":
-            for i, j in itertools.combinations(range(filed_size), 2):
-                self.bilinear.append(
-                    nn.Linear(embedding_size, embedding_size, bias=False))
+        elif self.bilinear_type in ("each", "interaction"):
+            num_weights = filed_size if self.bilinear_type == "each" else filed_size * (filed_size - 1) // 2
+            # one (embedding_size, embedding_size) matrix per field or per field pair, stored as a single tensor
+            # and initialized like the bias-free nn.Linear layers it replaces
+            self.weight = nn.Parameter(torch.empty(num_weights, embedding_size, embedding_size))
+            for i in range(num_weights):
+                nn.init.kaiming_uniform_(self.weight[i], a=math.sqrt(5))
         else:
             raise NotImplementedError
+        # field pairs (i, j), i < j, gathered at once instead of splitting the input into fields
+        pairs = list(itertools.combinations(range(filed_size), 2))
+        register_index_buffer(self, 'row', torch.LongTensor([i for i, _ in pairs]))
+        register_index_buffer(self, 'col', torch.LongTensor([j for _, j in pairs]))
         self.to(device)
 
     def forward(self, inputs):
         if len(inputs.shape) != 3:
             raise ValueError(
                 "Unexpected inputs dimensions %d, expect to be 3 dimensions" % (len(inputs.shape)))
-        inputs = torch.split(inputs, 1, dim=1)
         if self.bilinear_type == "all":
-            p = [torch.mul(self.bilinear(v_i), v_j)
-                 for v_i, v_j in itertools.combinations(inputs, 2)]
+            v_i = self.bilinear(inputs[:, self.row])
         elif self.bilinear_type == "each":
-            p = [torch.mul(self.bilinear[i](inputs[i]), inputs[j])
-                 for i, j in itertools.combinations(range(len(inputs)), 2)]
+            # the last field is never the left side of a pair, so its matrix is not applied
+            v_i = torch.einsum('bfe,fde->bfd', inputs[:, :-1], self.weight[:-1])[:, self.row]
         elif self.bilinear_type == "interaction":
-            p = [torch.mul(bilinear(v[0]), v[1])
-                 for v, bilinear in zip(itertools.combinations(inputs, 2), self.bilinear)]
+            v_i = torch.einsum('bpe,pde->bpd', inputs[:, self.row], self.weight)
         else:
             raise NotImplementedError
-        return torch.cat(p, dim=1)
+        # the gathered inputs come first so the output keeps their contiguous (batch, pair, embedding) layout
+        return torch.mul(inputs[:, self.col], v_i)
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        # checkpoints saved before the matrices were stacked hold one nn.Linear per field or field pair
+        if self.bilinear_type != "all" and prefix + 'weight' not in state_dict:
+            old_keys = [prefix + 'bilinear.%d.weight' % i for i in range(self.weight.shape[0])]
+            if all(key in state_dict for key in old_keys):
+                state_dict[prefix + 'weight'] = torch.stack([state_dict.pop(key) for key in old_keys])
+        super(BilinearInteraction, self)._load_from_state_dict(state_dict, prefix, *args, **kwargs)
 
 
 class CIN(nn.Module):
@@ -408,18 +419,26 @@ class CrossNet(nn.Module):
     def __init__(self, input_feature_num, layer_num=2, seed=1024, device='cpu'):
         super(CrossNet, self).__init__()
         self.layer_num = layer_num
-        self.kernels = torch.nn.ParameterList(
-            [nn.Parameter(nn.init.xavier_normal_(torch.empty(input_feature_num, 1))) for i in range(self.layer_num)])
-        self.bias = torch.nn.ParameterList(
-            [nn.Parameter(nn.init.zeros_(torch.empty(input_feature_num, 1))) for i in range(self.layer_num)])
+        # one row per cross layer, kept in a single (layer_num, units) tensor
+        self.weight = nn.Parameter(torch.empty(self.layer_num, input_feature_num))
+        for i in range(self.layer_num):
+            nn.init.xavier_normal_(self.weight[i].unsqueeze(1))
+        self.bias = nn.Parameter(torch.zeros(self.layer_num, input_feature_num))
         self.to(device)
 
     def forward(self, inputs):
-        x_0 = inputs.unsqueeze(2)
+        x_0 = inputs
         x_l = x_0
         for i in range(self.layer_num):
-            xl_w = torch.tensordot(x_l, self.kernels[i], dims=([1], [0]))
-            dot_ = torch.matmul(x_0, xl_w)
-            x_l = dot_ + self.bias[i] + x_l
-        x_l = torch.squeeze(x_l, dim=2)
-        return x_l
\ No newline at end of file
+            xl_w = torch.mv(x_l, self.weight[i]).unsqueeze(1)
+            x_l = x_0 * xl_w + self.bias[i] + x_l
+        return x_l
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        # checkpoints saved before the layers were stacked hold one (units, 1) kernel and bias per layer
+        for name, old_name in (('weight', 'kernels'), ('bias', 'bias')):
+            old_keys = [prefix + '%s.%d' % (old_name, i) for i in range(self.layer_num)]
+            if prefix + name not in state_dict and all(key in state_dict for key in old_keys):
+                state_dict[prefix + name] = torch.stack([state_dict.pop(key).squeeze(1) for key in old_keys]) \
+                    if len(old_keys) else getattr(self, name).detach()
+        super(CrossNet, self)._load_from_state_dict(state_dict, prefix, *args, **kwargs)
\ No newline at end of file
@@ -5,8 +5,11 @@ Author:
     Weichen Shen,wcshen1994@163.com
 
 """
+import contextlib
+
 import numpy as np
 import torch
+import torch.nn as nn
 
 
 def concat_fun(inputs, axis=-1):
@@ -68,3 +71,41 @@ def slice_arrays(arrays, start=None, stop=None):
             return arrays[start:stop]
         else:
             return [None]
+
+
+def register_index_buffer(module, name, tensor):
+    """Register an index tensor derived from the feature configuration as a buffer of ``module``.
+
+    It follows the module across devices but is left out of the state dict, so checkpoints never
+    overwrite it. torch<1.6 has no non-persistent buffers and saves it like any other buffer.
+    """
+    try:
+        module.register_buffer(name, tensor, persistent=False)
+    except TypeError:
+        module.register_buffer(name, tensor)
+
+
+def compile_module(module, **kwargs):
+    """Compile ``module`` in place with ``torch.compile`` so that its elementwise ops get fused.
+
+    ``nn.Module.compile`` keeps parameter names unchanged, so state dicts stay compatible.
+    On torch versions without it (<2.2) the module is returned untouched.
+    """
+    if hasattr(nn.Module, 'compile'):
+        module.compile(**kwargs)
+    return module
+
+
+def retain_graph_compile_context():
+    """Context for a training step that backpropagates with ``retain_graph=True``.
+
+    Compiled backward graphs only support retaining the graph when their saved buffers are not
+    donated, so buffer donation is switched off for the duration of the step only.
+    """
+    try:
+        import torch._functorch.config as functorch_config
+    except ImportError:
+        return contextlib.suppress()
+    if not hasattr(functorch_config, 'donated_buffer'):
+        return contextlib.suppress()
+    return functorch_config.patch(donated_buffer=False)
@@ -11,6 +11,7 @@ import torch.nn.functional as F
 
 from .basemodel import BaseModel
 from ..layers import FM, AFMLayer
+from ..layers.utils import concat_fun
 
 
 class AFM(BaseModel):
@@ -59,12 +60,13 @@ class AFM(BaseModel):
 
         sparse_embedding_list, _ = self.input_from_feature_columns(X, self.dnn_feature_columns,
                                                                                   self.embedding_dict,support_dense=False)
-        logit = self.linear_model(X)
+        logit = self._linear_logit(X)
         if len(sparse_embedding_list) > 0:
+            fm_input = concat_fun(sparse_embedding_list, axis=1)
             if self.use_attention:
-                logit += self.fm(sparse_embedding_list)
+                logit += self.fm(torch.split(fm_input, 1, dim=1))
             else:
-                logit += self.fm(torch.cat(sparse_embedding_list, dim=1))
+                logit += self.fm(fm_input)
 
         y_pred = self.out(logit)
 
@@ -52,7 +52,7 @@ class AutoInt(BaseModel):
         if len(dnn_hidden_units) <= 0 and att_layer_num <= 0:
             raise ValueError("Either hidden_layer or att_layer_num must > 0")
         self.use_dnn = len(dnn_feature_columns) > 0 and len(dnn_hidden_units) > 0
-        field_num = len(self.embedding_dict)
+        field_num = len(self._sparse_cols)
 
         if len(dnn_hidden_units) and att_layer_num > 0:
             dnn_linear_in_feature = dnn_hidden_units[-1] + \
@@ -7,6 +7,7 @@ Author:
 """
 from __future__ import print_function
 
+import contextlib
 import time
 
 import numpy as np
@@ -20,7 +21,22 @@ from tqdm import tqdm
 
 from ..inputs import build_input_features, SparseFeat, DenseFeat
 from ..layers import PredictionLayer
-from ..layers.utils import slice_arrays
+from ..layers.utils import slice_arrays, register_index_buffer, retain_graph_compile_context
+
+
+def _foreach_norm_has_autograd():
+    """Whether ``torch._foreach_norm`` exists and can be backpropagated (added in torch 1.11, autograd in 2.1)."""
+    if not hasattr(torch, '_foreach_norm'):
+        return False
+    weight = torch.ones(1, requires_grad=True)
+    try:
+        torch._foreach_norm([weight])[0].backward()
+    except RuntimeError:
+        return False
+    return weight.grad is not None
+
+
+_FOREACH_NORM_HAS_AUTOGRAD = _foreach_norm_has_autograd()
 
 
 class Linear(nn.Module):
@@ -33,16 +49,8 @@ class Linear(nn.Module):
         self.dense_feature_columns = list(
             filter(lambda x: isinstance(x, DenseFeat), feature_columns)) if len(feature_columns) else []
 
-        self.embedding_dict = self.create_embedding_matrix(self.sparse_feature_columns, 1, init_std, sparse=False).to(
-            device)
-
-        #         nn.ModuleDict(
-        #             {feat.embedding_name: nn.Embedding(feat.dimension, 1, sparse=True) for feat in
-        #              self.sparse_feature_columns}
-        #         )
-        # .to("cuda:1")
-        for tensor in self.embedding_dict.values():
-            nn.init.normal_(tensor.weight, mean=0, std=init_std)
+        self.embedding_dict = FusedEmbedding(self.sparse_feature_columns, feature_index, 1, init_std, sparse=False,
+                                             device=device)
 
         if len(self.dense_feature_columns) > 0:
             self.weight = nn.Parameter(torch.Tensor(len(self.dense_feature_columns), 1)).to(
@@ -50,22 +58,17 @@ class Linear(nn.Module):
             torch.nn.init.normal_(self.weight, mean=0, std=init_std)
 
     def forward(self, X):
-        sparse_embedding_list = [self.embedding_dict[feat.embedding_name](
-            X[:, self.feature_index[feat.name][0]:self.feature_index[feat.name][1]].long()) for
-            feat in self.sparse_feature_columns]
-
         dense_value_list = [X[:, self.feature_index[feat.name][0]:self.feature_index[feat.name][1]] for feat in
                             self.dense_feature_columns]
 
-        if len(sparse_embedding_list) > 0 and len(dense_value_list) > 0:
-            linear_sparse_logit = torch.sum(
-                torch.cat(sparse_embedding_list, dim=-1), dim=-1, keepdim=False)
+        if len(self.sparse_feature_columns) > 0 and len(dense_value_list) > 0:
+            # (batch_size, field_size, 1) -> (batch_size, 1)
+            linear_sparse_logit = torch.sum(self.embedding_dict(X), dim=1)
             linear_dense_logit = torch.cat(
                 dense_value_list, dim=-1).matmul(self.weight)
             linear_logit = linear_sparse_logit + linear_dense_logit
-        elif len(sparse_embedding_list) > 0:
-            linear_logit = torch.sum(
-                torch.cat(sparse_embedding_list, dim=-1), dim=-1, keepdim=False)
+        elif len(self.sparse_feature_columns) > 0:
+            linear_logit = torch.sum(self.embedding_dict(X), dim=1)
         elif len(dense_value_list) > 0:
             linear_logit = torch.cat(
                 dense_value_list, dim=-1).matmul(self.weight)
@@ -73,19 +76,106 @@ class Linear(nn.Module):
             linear_logit = torch.zeros([X.shape[0],1])
         return linear_logit
 
-    def create_embedding_matrix(self, feature_columns, embedding_size, init_std=0.0001, sparse=False):
+
+class FusedEmbedding(nn.Module):
+    """Embedding tables of all sparse features stored in a single matrix.
+
+    Each ``embedding_name`` owns a contiguous block of rows, so looking up every field is
+    one gather on ``index + offset`` instead of one ``nn.Embedding`` call per feature.
+    The output is a 3D tensor with shape ``(batch_size, field_size, embedding_size)``.
+    """
+
+    def __init__(self, feature_columns, feature_index, embedding_size, init_std=0.0001, sparse=False, device='cpu'):
+        super(FusedEmbedding, self).__init__()
+        self.sparse = sparse
+        self.quantized = False
 
         sparse_feature_columns = list(
             filter(lambda x: isinstance(x, SparseFeat), feature_columns)) if len(feature_columns) else []
 
-        embedding_dict = nn.ModuleDict(
-            {feat.embedding_name: nn.Embedding(feat.dimension, embedding_size, sparse=sparse) for feat in
-             sparse_feature_columns}
-        )
-        for tensor in embedding_dict.values():
-            nn.init.normal_(tensor.weight, mean=0, std=init_std)
+        table_offset = {}
+        self.table_names = []
+        self.table_sizes = []
+        for feat in sparse_feature_columns:
+            if feat.embedding_name not in table_offset:
+                table_offset[feat.embedding_name] = sum(self.table_sizes)
+                self.table_names.append(feat.embedding_name)
+                self.table_sizes.append(feat.dimension)
+
+        self.weight = nn.Parameter(torch.Tensor(sum(self.table_sizes), embedding_size))
+        nn.init.normal_(self.weight, mean=0, std=init_std)
+
+        register_index_buffer(self, 'sparse_index', torch.LongTensor(
+            [feature_index[feat.name][0] for feat in sparse_feature_columns]))
+        register_index_buffer(self, 'offsets', torch.LongTensor(
+            [table_offset[feat.embedding_name] for feat in sparse_feature_columns]))
+        self.field_position = {feat.name: i for i, feat in enumerate(sparse_feature_columns)}
+        self._subset_index = {}
+        self.to(device)
 
-        return embedding_dict
+    def forward(self, X, feature_columns=None):
+        """Look up every field of the table, or only the sparse ``feature_columns`` in their given order."""
+        if feature_columns is None:
+            sparse_index, offsets = self.sparse_index, self.offsets
+        else:
+            sparse_index, offsets = self._subset(tuple(feat.name for feat in feature_columns))
+        idx = X[:, sparse_index].long() + offsets
+        if self.quantized:
+            # every (sample, field) index is its own bag of one row
+            emb = torch.ops.quantized.embedding_bag_byte_rowwise_offsets(self.packed_weight, idx.reshape(-1, 1))
+            return emb.view(idx.shape[0], idx.shape[1], -1)
+        return F.embedding(idx, self.weight, sparse=self.sparse)
+
+    def _subset(self, names):
+        # the column and offset indices of a subset are gathered once per column tuple and device
+        key = (names, self.sparse_index.device)
+        if key not in self._subset_index:
+            missing = [name for name in names if name not in self.field_position]
+            if missing:
+                raise ValueError("features %s are not in the embedding table" % missing)
+            fields = torch.LongTensor([self.field_position[name] for name in names]).to(self.sparse_index.device)
+            self._subset_index[key] = (self.sparse_index[fields], self.offsets[fields])
+        return self._subset_index[key]
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        # checkpoints saved before the tables were fused hold one nn.Embedding per embedding_name
+        old_keys = [prefix + name + '.weight' for name in self.table_names]
+        if not self.quantized and prefix + 'weight' not in state_dict and all(key in state_dict for key in old_keys):
+            state_dict[prefix + 'weight'] = torch.cat([state_dict.pop(key) for key in old_keys]) \
+                if len(old_keys) else self.weight.detach()
+        # the index buffers are derived from the feature columns and no longer saved
+        state_dict.pop(prefix + 'sparse_index', None)
+        state_dict.pop(prefix + 'offsets', None)
+        super(FusedEmbedding, self)._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+
+    def to_int8(self):
+        """Replace ``weight`` with a row-wise quantized 8-bit copy for inference.
+
+        Each row is stored as uint8 codes plus its own float scale and bias (the layout of
+        ``torch.ops.quantized.embedding_bag_byte_prepack``), so a lookup reads about 4x fewer bytes.
+        The table can not be trained afterwards.
+        """
+        if not self.int8_supported():
+            raise RuntimeError("to_int8 requires the quantized embedding_bag_byte ops, which this torch "
+                               "version (%s) does not provide" % torch.__version__)
+        packed_weight = torch.ops.quantized.embedding_bag_byte_prepack(self.weight.detach().float().cpu())
+        del self.weight
+        self.register_buffer('packed_weight', packed_weight.to(self.offsets.device))
+        self.quantized = True
+        return self
+
+    @staticmethod
+    def int8_supported():
+        """Whether this torch build provides the row-wise 8-bit embedding ops used by ``to_int8``."""
+        try:
+            return hasattr(torch.ops.quantized, 'embedding_bag_byte_prepack') and \
+                hasattr(torch.ops.quantized, 'embedding_bag_byte_rowwise_offsets')
+        except RuntimeError:
+            return False
+
+    def table_weights(self):
+        """Row blocks of ``weight`` belonging to each embedding table."""
+        return torch.split(self.weight, self.table_sizes)
 
 
 class BaseModel(nn.Module):
@@ -100,25 +190,39 @@ class BaseModel(nn.Module):
 
         self.reg_loss = torch.zeros((1,), device=device)
         self.device = device  # device
+        self.inference_dtype = None
 
         self.feature_index = build_input_features(
             linear_feature_columns + dnn_feature_columns)
+        # column layout of dnn_feature_columns, computed once for compute_input_dim and every forward
+        self._sparse_cols = list(
+            filter(lambda x: isinstance(x, SparseFeat), dnn_feature_columns)) if len(dnn_feature_columns) else []
+        self._dense_cols = list(
+            filter(lambda x: isinstance(x, DenseFeat), dnn_feature_columns)) if len(dnn_feature_columns) else []
+        self._dense_dims = np.array([feat.dimension for feat in self._dense_cols], dtype=np.int64)
+        # all dense columns of X, gathered with a single index instead of one slice per feature
+        register_index_buffer(self, 'dense_index', torch.LongTensor(
+            [i for feat in self._dense_cols for i in range(*self.feature_index[feat.name])]))
         self.dnn_feature_columns = dnn_feature_columns
 
-        self.embedding_dict = self.create_embedding_matrix(dnn_feature_columns, embedding_size, init_std,
+        self.embedding_dict = self.create_embedding_matrix(self._sparse_cols, embedding_size, init_std,
                                                            sparse=False).to(device)
         #         nn.ModuleDict(
         #             {feat.embedding_name: nn.Embedding(feat.dimension, embedding_size, sparse=True) for feat in
         #              self.dnn_feature_columns}
         #         )
 
+        # models without linear features (e.g. DCN) skip the linear part entirely
         self.linear_model = Linear(
-            linear_feature_columns, self.feature_index, device=device)
+            linear_feature_columns, self.feature_index, device=device) if len(linear_feature_columns) else None
 
         self.add_regularization_loss(
-            self.embedding_dict.parameters(), l2_reg_embedding)
-        self.add_regularization_loss(
-            self.linear_model.parameters(), l2_reg_linear)
+            self.embedding_dict.table_weights(), l2_reg_embedding)
+        if self.linear_model is not None:
+            linear_weights = list(self.linear_model.embedding_dict.table_weights())
+            if len(self.linear_model.dense_feature_columns) > 0:
+                linear_weights.append(self.linear_model.weight)
+            self.add_regularization_loss(linear_weights, l2_reg_linear)
 
         self.out = PredictionLayer(task, )
         self.to(device)
@@ -190,16 +294,17 @@ class BaseModel(nn.Module):
                         x = x_train.to(self.device).float()
                         y = y_train.to(self.device).float()
 
-                        y_pred = model(x).squeeze()
+                        with retain_graph_compile_context():
+                            y_pred = model(x).squeeze()
 
-                        optim.zero_grad()
-                        loss = loss_func(y_pred, y.squeeze(), reduction='sum')
+                            optim.zero_grad()
+                            loss = loss_func(y_pred, y.squeeze(), reduction='sum')
 
-                        total_loss = loss + self.reg_loss
+                            total_loss = loss + self.reg_loss
 
-                        loss_epoch += loss.item()
-                        total_loss_epoch += total_loss.item()
-                        total_loss.backward(retain_graph=True)
+                            loss_epoch += loss.item()
+                            total_loss_epoch += total_loss.item()
+                            total_loss.backward(retain_graph=True)
                         optim.step()
 
                         if verbose > 0:
@@ -258,59 +363,97 @@ class BaseModel(nn.Module):
                 pred_ans.append(y_pred)
         return np.concatenate(pred_ans)
 
+    def to_bf16_inference(self):
+        """Store the weights of Linear, Conv1d and BatchNorm1d layers in bfloat16 for inference.
+
+        Embedding tables stay in float32. Every later call of the model runs under bfloat16 autocast,
+        and the output is returned in float32. Requires torch>=1.10.
+        """
+        if not hasattr(torch, 'autocast'):
+            raise RuntimeError("to_bf16_inference requires torch.autocast (torch>=1.10)")
+        for module in self.modules():
+            if isinstance(module, (nn.Linear, nn.Conv1d, nn.BatchNorm1d)):
+                module.to(torch.bfloat16)
+        self.inference_dtype = torch.bfloat16
+        return self.eval()
+
+    def __call__(self, *args, **kwargs):
+        # models converted by to_bf16_inference run every forward pass under autocast
+        with self._inference_autocast():
+            return super(BaseModel, self).__call__(*args, **kwargs)
+
+    def _inference_autocast(self):
+        if self.inference_dtype is None:
+            return contextlib.suppress()
+        return torch.autocast(torch.device(self.device).type, dtype=self.inference_dtype)
+
     def input_from_feature_columns(self, X, feature_columns, embedding_dict, support_dense=True):
-        sparse_feature_columns = list(
-            filter(lambda x: isinstance(x, SparseFeat), feature_columns)) if len(feature_columns) else []
-        dense_feature_columns = list(
-            filter(lambda x: isinstance(x, DenseFeat), feature_columns)) if len(feature_columns) else []
+        sparse_feature_columns, dense_feature_columns = self._split_feature_columns(feature_columns)
 
         if not support_dense and len(dense_feature_columns) > 0:
             raise ValueError(
                 "DenseFeat is not supported in dnn_feature_columns")
 
-        sparse_embedding_list = [embedding_dict[feat.embedding_name](
-            X[:, self.feature_index[feat.name][0]:self.feature_index[feat.name][1]].long()) for
-            feat in sparse_feature_columns]
-        dense_value_list = [X[:, self.feature_index[feat.name][0]:self.feature_index[feat.name][1]] for feat in
-                            dense_feature_columns]
+        # a single (batch_size, field_size, embedding_size) tensor from the fused table
+        if len(sparse_feature_columns) == 0:
+            sparse_embedding_list = []
+        elif sparse_feature_columns is self._sparse_cols and embedding_dict is self.embedding_dict:
+            sparse_embedding_list = [embedding_dict(X)]
+        else:
+            sparse_embedding_list = [embedding_dict(X, sparse_feature_columns)]
+        if len(dense_feature_columns) == 0:
+            dense_value_list = []
+        elif dense_feature_columns is self._dense_cols:
+            # one (batch_size, dense_dim) tensor
+            dense_value_list = [X[:, self.dense_index]]
+        else:
+            dense_value_list = [X[:, self.feature_index[feat.name][0]:self.feature_index[feat.name][1]] for feat in
+                                dense_feature_columns]
 
         return sparse_embedding_list, dense_value_list
 
-    def create_embedding_matrix(self, feature_columns, embedding_size, init_std=0.0001, sparse=False):
-
-        sparse_feature_columns = list(
-            filter(lambda x: isinstance(x, SparseFeat), feature_columns)) if len(feature_columns) else []
+    def _linear_logit(self, X):
+        """Logit of the linear part, or zeros when the model has no linear feature columns."""
+        if self.linear_model is None:
+            return torch.zeros((X.shape[0], 1), device=X.device)
+        return self.linear_model(X)
 
-        embedding_dict = nn.ModuleDict(
-            {feat.embedding_name: nn.Embedding(feat.dimension, embedding_size, sparse=sparse) for feat in
-             sparse_feature_columns}
-        )
-        for tensor in embedding_dict.values():
-            nn.init.normal_(tensor.weight, mean=0, std=init_std)
-
-        return embedding_dict
+    def create_embedding_matrix(self, feature_columns, embedding_size, init_std=0.0001, sparse=False):
+        return FusedEmbedding(feature_columns, self.feature_index, embedding_size, init_std, sparse=sparse)
 
-    def compute_input_dim(self, feature_columns, embedding_size, dense_only=False):
+    def _split_feature_columns(self, feature_columns):
+        if feature_columns is self.dnn_feature_columns:
+            return self._sparse_cols, self._dense_cols
         sparse_feature_columns = list(
             filter(lambda x: isinstance(x, SparseFeat), feature_columns)) if len(feature_columns) else []
         dense_feature_columns = list(
             filter(lambda x: isinstance(x, DenseFeat), feature_columns)) if len(feature_columns) else []
+        return sparse_feature_columns, dense_feature_columns
+
+    def _feature_columns_size(self, feature_columns):
+        """Return the number of sparse fields and the total dense dimension of ``feature_columns``."""
+        if feature_columns is self.dnn_feature_columns:
+            return len(self._sparse_cols), int(self._dense_dims.sum())
+        sparse_feature_columns, dense_feature_columns = self._split_feature_columns(feature_columns)
+        return len(sparse_feature_columns), sum(map(lambda x: x.dimension, dense_feature_columns))
 
+    def compute_input_dim(self, feature_columns, embedding_size, dense_only=False):
+        field_size, dense_dim = self._feature_columns_size(feature_columns)
         if dense_only:
-            return sum(map(lambda x: x.dimension, dense_feature_columns))
+            return dense_dim
         else:
-
-            return len(sparse_feature_columns) * embedding_size + sum(map(lambda x: x.dimension, dense_feature_columns))
+            return field_size * embedding_size + dense_dim
 
     def add_regularization_loss(self, weight_list, weight_decay, p=2):
-        reg_loss = torch.zeros((1,), device=self.device)
-        for w in weight_list:
-            if isinstance(w, tuple):
-                l2_reg = torch.norm(w[1], p=p, )
-            else:
-                l2_reg = torch.norm(w, p=p, )
-            reg_loss = reg_loss + l2_reg
-        reg_loss = weight_decay * reg_loss
+        weight_list = [w[1] if isinstance(w, tuple) else w for w in weight_list]
+        if len(weight_list) == 0:
+            return
+        if _FOREACH_NORM_HAS_AUTOGRAD:
+            # one multi-tensor kernel instead of a norm launch per weight
+            norms = torch._foreach_norm(weight_list, p)
+        else:
+            norms = [torch.norm(w, p=p, ) for w in weight_list]
+        reg_loss = weight_decay * torch.stack(norms).sum()
         self.reg_loss += reg_loss
 
     def compile(self, optimizer,
@@ -12,6 +12,7 @@ import torch.nn.functional as F
 from .basemodel import BaseModel
 from ..inputs import combined_dnn_input
 from ..layers import CrossNet, DNN
+from ..layers.utils import compile_module
 
 
 class DCN(BaseModel):
@@ -30,6 +31,7 @@ class DCN(BaseModel):
     :param dnn_activation: Activation function to use in DNN
     :param task: str, ``"binary"`` for  binary logloss or  ``"regression"`` for regression loss
     :param device:
+    :param use_compile: bool. Whether to compile the DNN and cross network with ``torch.compile`` (torch>=2.2)
     :return: A PyTorch model instance.
     """
 
@@ -38,7 +40,7 @@ class DCN(BaseModel):
                  dnn_hidden_units=(128, 128), l2_reg_linear=0.00001,
                  l2_reg_embedding=0.00001, l2_reg_cross=0.00001, l2_reg_dnn=0, init_std=0.0001, seed=1024,
                  dnn_dropout=0,
-                 dnn_activation=F.relu, dnn_use_bn=False, task='binary', device='cpu'):
+                 dnn_activation=F.relu, dnn_use_bn=False, task='binary', device='cpu', use_compile=True):
 
         super(DCN, self).__init__(linear_feature_columns=[],
                                   dnn_feature_columns=dnn_feature_columns,
@@ -50,25 +52,30 @@ class DCN(BaseModel):
                                   task=task, device=device)
         self.dnn_hidden_units = dnn_hidden_units
         self.cross_num = cross_num
-        self.dnn = DNN(self.compute_input_dim(dnn_feature_columns, embedding_size, ), dnn_hidden_units,
+        dnn_input_dim = self.compute_input_dim(dnn_feature_columns, embedding_size)
+        self.dnn = DNN(dnn_input_dim, dnn_hidden_units,
                        activation=dnn_activation, use_bn=dnn_use_bn, l2_reg=l2_reg_dnn, dropout_rate=dnn_dropout,
                        init_std=init_std, device=device)
         if len(self.dnn_hidden_units) > 0 and self.cross_num > 0:
-            dnn_linear_in_feature = self.compute_input_dim(dnn_feature_columns, embedding_size, ) + dnn_hidden_units[-1]
+            dnn_linear_in_feature = dnn_input_dim + dnn_hidden_units[-1]
         elif len(self.dnn_hidden_units) > 0:
             dnn_linear_in_feature = dnn_hidden_units[-1]
         elif self.cross_num > 0:
-            dnn_linear_in_feature = self.compute_input_dim(dnn_feature_columns, embedding_size, )
+            dnn_linear_in_feature = dnn_input_dim
 
-        self.dnn_linear = nn.Linear(dnn_linear_in_feature, 1, bias=False).to(
-            device)
-        self.crossnet = CrossNet(input_feature_num=self.compute_input_dim(dnn_feature_columns, embedding_size, ),
+        self.dnn_linear = nn.Linear(dnn_linear_in_feature, 1, bias=False)
+        self.crossnet = CrossNet(input_feature_num=dnn_input_dim,
                                  layer_num=cross_num, seed=1024, device=device)
+        if use_compile:
+            compile_module(self.dnn, dynamic=True)
+            compile_module(self.crossnet, dynamic=True, mode="reduce-overhead")
+        self.to(device)
+
+        # registered after self.to(device) so the penalty is computed on the moved weights
         self.add_regularization_loss(
-            filter(lambda x: 'weight' in x[0] and 'bn' not in x[0], self.dnn.named_parameters()), l2_reg_dnn)
+            [w for name, w in self.dnn.named_parameters() if 'weight' in name and 'bn' not in name], l2_reg_dnn)
         self.add_regularization_loss(self.dnn_linear.weight, l2_reg_linear)
-        self.add_regularization_loss(self.crossnet.kernels, l2_reg_cross)
-        self.to(device)
+        self.add_regularization_loss(self.crossnet.weight, l2_reg_cross)
 
     def forward(self, X):
 
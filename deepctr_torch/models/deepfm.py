@@ -12,6 +12,7 @@ import torch.nn.functional as F
 from .basemodel import BaseModel
 from ..inputs import combined_dnn_input
 from ..layers import FM, DNN
+from ..layers.utils import concat_fun
 
 
 class DeepFM(BaseModel):
@@ -70,10 +71,10 @@ class DeepFM(BaseModel):
 
         sparse_embedding_list, dense_value_list = self.input_from_feature_columns(X, self.dnn_feature_columns,
                                                                                   self.embedding_dict)
-        logit = self.linear_model(X)
+        logit = self._linear_logit(X)
 
         if self.use_fm and len(sparse_embedding_list) > 0:
-            fm_input = torch.cat(sparse_embedding_list, dim=1)
+            fm_input = concat_fun(sparse_embedding_list, axis=1)
             logit += self.fm(fm_input)
 
         if self.use_dnn:
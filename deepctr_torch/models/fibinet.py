@@ -11,8 +11,9 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 from .basemodel import BaseModel
-from ..inputs import combined_dnn_input, SparseFeat, DenseFeat
+from ..inputs import combined_dnn_input
 from ..layers import SENETLayer,BilinearInteraction,DNN
+from ..layers.utils import concat_fun, compile_module
 
 
 
@@ -33,13 +34,14 @@ class FiBiNET(BaseModel):
     :param dnn_activation: Activation function to use in DNN
     :param task: str, ``"binary"`` for  binary logloss or  ``"regression"`` for regression loss
     :param divece:
+    :param use_compile: bool. Whether to compile the DNN with ``torch.compile`` (torch>=2.2)
     :return: A PyTorch model instance.
     """
 
     def __init__(self, linear_feature_columns, dnn_feature_columns, embedding_size=8, bilinear_type='interaction',
                  reduction_ratio=3, dnn_hidden_units=(128, 128), l2_reg_linear=1e-5,
                  l2_reg_embedding=1e-5, l2_reg_dnn=0, init_std=0.0001, seed=1024, dnn_dropout=0, dnn_activation=F.relu,
-                 task='binary', device='cpu'):
+                 task='binary', device='cpu', use_compile=True):
         super(FiBiNET, self).__init__(linear_feature_columns, dnn_feature_columns, embedding_size=embedding_size,
                                       dnn_hidden_units=dnn_hidden_units,
                                       l2_reg_linear=l2_reg_linear,
@@ -49,46 +51,45 @@ class FiBiNET(BaseModel):
                                       task=task, device=device)
         self.linear_feature_columns = linear_feature_columns
         self.dnn_feature_columns = dnn_feature_columns
-        self.filed_size = len(self.embedding_dict)
+        self.filed_size = len(self._sparse_cols)
         self.SE = SENETLayer(self.filed_size, reduction_ratio, seed, device)
         self.Bilinear = BilinearInteraction(self.filed_size,embedding_size, bilinear_type, seed, device)
         self.dnn = DNN(self.compute_input_dim(dnn_feature_columns, embedding_size, ), dnn_hidden_units,
                        activation=dnn_activation, l2_reg=l2_reg_dnn, dropout_rate=dnn_dropout, use_bn=False,
                        init_std=init_std,device=device)
-        self.dnn_linear = nn.Linear(dnn_hidden_units[-1], 1, bias=False).to(device)
+        if use_compile:
+            compile_module(self.dnn, dynamic=True)
+        self.dnn_linear = nn.Linear(dnn_hidden_units[-1], 1, bias=False)
+        self.to(device)
 
     def compute_input_dim(self, feature_columns, embedding_size, dense_only=False):
-        sparse_feature_columns = list(
-            filter(lambda x: isinstance(x, SparseFeat), feature_columns)) if len(feature_columns) else []
-        dense_feature_columns = list(
-            filter(lambda x: isinstance(x, DenseFeat), feature_columns)) if len(feature_columns) else []
-        field_size = len(sparse_feature_columns)
+        field_size, dense_dim = self._feature_columns_size(feature_columns)
         if dense_only:
-            return sum(map(lambda x: x.dimension, dense_feature_columns))
+            return dense_dim
         else:
-            return field_size * (field_size - 1) * embedding_size + sum(map(lambda x: x.dimension, dense_feature_columns))
+            return field_size * (field_size - 1) * embedding_size + dense_dim
 
     def forward(self, X):
         sparse_embedding_list, dense_value_list = self.input_from_feature_columns(X, self.dnn_feature_columns,
                                                                                   self.embedding_dict)
-        sparse_embedding_input = torch.cat(sparse_embedding_list, dim=1)
+        sparse_embedding_input = concat_fun(sparse_embedding_list, axis=1)
 
         senet_output = self.SE(sparse_embedding_input)
-        senet_bilinear_out = self.Bilinear(senet_output)
-        bilinear_out = self.Bilinear(sparse_embedding_input)
+        # Bilinear weights are shared across the batch, so both inputs go through one call
+        senet_bilinear_out, bilinear_out = self.Bilinear(
+            torch.cat((senet_output, sparse_embedding_input), dim=0)).chunk(2, dim=0)
 
-        linear_logit = self.linear_model(X)
-        temp = torch.split(torch.cat((senet_bilinear_out,bilinear_out), dim = 1), 1, dim = 1)
-        dnn_input = combined_dnn_input(temp, dense_value_list)
+        bilinear_out = torch.cat((senet_bilinear_out, bilinear_out), dim=1)
+        dnn_input = combined_dnn_input([bilinear_out], dense_value_list)
         dnn_output = self.dnn(dnn_input)
-        dnn_logit = self.dnn_linear(dnn_output)
 
         if len(self.linear_feature_columns) > 0 and len(self.dnn_feature_columns) > 0:  # linear + dnn
-            final_logit = linear_logit + dnn_logit
+            # addmm adds the linear logit inside the output projection instead of in a separate kernel
+            final_logit = torch.addmm(self.linear_model(X), dnn_output, self.dnn_linear.weight.t())
         elif len(self.linear_feature_columns) == 0:
-            final_logit = dnn_logit
+            final_logit = self.dnn_linear(dnn_output)
         elif len(self.dnn_feature_columns) == 0:
-            final_logit = linear_logit
+            final_logit = self.linear_model(X)
         else:
             raise NotImplementedError
 
@@ -135,7 +135,7 @@ class NFFM(BaseModel):
 
         _, dense_value_list = self.input_from_feature_columns(X, self.dnn_feature_columns,
                                                               self.embedding_dict)
-        linear_logit = self.linear_model(X)
+        linear_logit = self._linear_logit(X)
         spare_second_order_embedding_list = self.__input_from_second_order_column(X, self.dnn_feature_columns,
                                                                                   self.second_order_embedding_dict)
         dnn_input = combined_dnn_input(
@@ -12,6 +12,7 @@ import torch.nn.functional as F
 from .basemodel import BaseModel
 from ..inputs import combined_dnn_input
 from ..layers import DNN, BiInteractionPooling
+from ..layers.utils import concat_fun
 
 
 class NFM(BaseModel):
@@ -66,8 +67,8 @@ class NFM(BaseModel):
 
         sparse_embedding_list, dense_value_list = self.input_from_feature_columns(X, self.dnn_feature_columns,
                                                                                   self.embedding_dict)
-        linear_logit = self.linear_model(X)
-        fm_input = torch.cat(sparse_embedding_list, dim=1)
+        linear_logit = self._linear_logit(X)
+        fm_input = concat_fun(sparse_embedding_list, axis=1)
         bi_out = self.bi_pooling(fm_input)
         if self.bi_dropout:
             bi_out = self.dropout(bi_out)
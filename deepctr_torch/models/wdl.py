@@ -60,7 +60,7 @@ class WDL(BaseModel):
 
         sparse_embedding_list, dense_value_list = self.input_from_feature_columns(X, self.dnn_feature_columns,
                                                                                   self.embedding_dict)
-        logit = self.linear_model(X)
+        logit = self._linear_logit(X)
 
         if self.use_dnn:
             dnn_input = combined_dnn_input(sparse_embedding_list, dense_value_list)
@@ -13,6 +13,7 @@ import torch.nn.functional as F
 from .basemodel import BaseModel
 from ..inputs import combined_dnn_input
 from ..layers import DNN, CIN
+from ..layers.utils import concat_fun, compile_module
 
 class xDeepFM(BaseModel):
     """Instantiates the xDeepFM architecture.
@@ -34,13 +35,14 @@ class xDeepFM(BaseModel):
     :param dnn_use_bn: bool. Whether use BatchNormalization before activation or not in DNN
     :param task: str, ``"binary"`` for  binary logloss or  ``"regression"`` for regression loss
     :param device: 
+    :param use_compile: bool. Whether to compile the DNN and CIN with ``torch.compile`` (torch>=2.2)
     :return: A PyTorch model instance.
     """
 
     def __init__(self, linear_feature_columns, dnn_feature_columns, embedding_size=8, dnn_hidden_units=(256, 256),
                  cin_layer_size=(256, 128,), cin_split_half=True, cin_activation=F.relu, l2_reg_linear=0.00001,
                  l2_reg_embedding=0.00001, l2_reg_dnn=0, l2_reg_cin=0, init_std=0.0001, seed=1024, dnn_dropout=0,
-                 dnn_activation=F.relu, dnn_use_bn=False, task='binary', device='cpu'):
+                 dnn_activation=F.relu, dnn_use_bn=False, task='binary', device='cpu', use_compile=True):
 
         super(xDeepFM, self).__init__(linear_feature_columns, dnn_feature_columns, embedding_size=embedding_size,
                                       dnn_hidden_units=dnn_hidden_units,
@@ -55,16 +57,15 @@ class xDeepFM(BaseModel):
             self.dnn = DNN(self.compute_input_dim(dnn_feature_columns, embedding_size, ), dnn_hidden_units,
                            activation=dnn_activation, l2_reg=l2_reg_dnn, dropout_rate=dnn_dropout, use_bn=dnn_use_bn,
                            init_std=init_std,device=device)
-            self.dnn_linear = nn.Linear(dnn_hidden_units[-1], 1, bias=False).to(device)
+            if use_compile:
+                compile_module(self.dnn, dynamic=True)
             self.add_regularization_loss(
-                filter(lambda x: 'weight' in x[0] and 'bn' not in x[0], self.dnn.named_parameters()), l2_reg_dnn)
-
-            self.add_regularization_loss(self.dnn_linear.weight, l2_reg_dnn)
+                [w for name, w in self.dnn.named_parameters() if 'weight' in name and 'bn' not in name], l2_reg_dnn)
 
         self.cin_layer_size = cin_layer_size
         self.use_cin = len(self.cin_layer_size) > 0 and len(dnn_feature_columns) > 0
         if self.use_cin:
-            field_num = len(self.embedding_dict)
+            field_num = len(self._sparse_cols)
             if cin_split_half == True:
                 self.featuremap_num = sum(
                     cin_layer_size[:-1]) // 2 + cin_layer_size[-1]
@@ -72,37 +73,54 @@ class xDeepFM(BaseModel):
                 self.featuremap_num = sum(cin_layer_size)
             self.cin = CIN(field_num, cin_layer_size,
                            cin_activation, cin_split_half, l2_reg_cin, seed,device=device)
-            self.cin_linear = nn.Linear(self.featuremap_num, 1, bias=False).to(device)
+            if use_compile:
+                compile_module(self.cin, dynamic=True)
             self.add_regularization_loss(
-            filter(lambda x: 'weight' in x[0], self.cin.named_parameters()), l2_reg_cin)
+                [w for name, w in self.cin.named_parameters() if 'weight' in name], l2_reg_cin)
 
+        if self.use_dnn and self.use_cin:
+            # one GEMM over [dnn_output, cin_output] instead of a dnn_linear and a cin_linear
+            self.combined_linear = nn.Linear(dnn_hidden_units[-1] + self.featuremap_num, 1, bias=False)
+        elif self.use_dnn:
+            self.dnn_linear = nn.Linear(dnn_hidden_units[-1], 1, bias=False)
+        elif self.use_cin:
+            self.cin_linear = nn.Linear(self.featuremap_num, 1, bias=False)
         self.to(device)
 
+        # registered after self.to(device) so the penalty is computed on the moved weights
+        if self.use_dnn and self.use_cin:
+            self.add_regularization_loss(self.combined_linear.weight[:, :dnn_hidden_units[-1]], l2_reg_dnn)
+        elif self.use_dnn:
+            self.add_regularization_loss(self.dnn_linear.weight, l2_reg_dnn)
+
     def forward(self, X):
 
         sparse_embedding_list, dense_value_list = self.input_from_feature_columns(X, self.dnn_feature_columns,
                                                                                   self.embedding_dict)
 
-        linear_logit = self.linear_model(X)
         if self.use_cin:
-            cin_input = torch.cat(sparse_embedding_list, dim=1)
+            cin_input = concat_fun(sparse_embedding_list, axis=1)
             cin_output = self.cin(cin_input)
-            cin_logit = self.cin_linear(cin_output)
         if self.use_dnn:
             dnn_input = combined_dnn_input(sparse_embedding_list, dense_value_list)
             dnn_output = self.dnn(dnn_input)
-            dnn_logit = self.dnn_linear(dnn_output)
 
-        if len(self.dnn_hidden_units) == 0 and len(self.cin_layer_size) == 0:  # only linear
-            final_logit = linear_logit
-        elif len(self.dnn_hidden_units) == 0 and len(self.cin_layer_size) > 0:  # linear + CIN
-            final_logit = linear_logit + cin_logit
-        elif len(self.dnn_hidden_units) > 0 and len(self.cin_layer_size) == 0:  # linear +　Deep
-            final_logit = linear_logit + dnn_logit
-        elif len(self.dnn_hidden_units) > 0 and len(self.cin_layer_size) > 0:  # linear + CIN + Deep
-            final_logit = linear_logit + dnn_logit + cin_logit
+        if self.use_dnn and self.use_cin:  # CIN + Deep
+            head_input, head = torch.cat((dnn_output, cin_output), dim=1), self.combined_linear
+        elif self.use_dnn:  # Deep
+            head_input, head = dnn_output, self.dnn_linear
+        elif self.use_cin:  # CIN
+            head_input, head = cin_output, self.cin_linear
+        else:  # only linear
+            head = None
+
+        if head is None:
+            final_logit = self._linear_logit(X)
+        elif self.linear_model is None:
+            final_logit = head(head_input)
         else:
-            raise NotImplementedError
+            # addmm adds the linear logit inside the output projection instead of in a separate kernel
+            final_logit = torch.addmm(self.linear_model(X), head_input, head.weight.t())
 
         y_pred = self.out(final_logit)
 
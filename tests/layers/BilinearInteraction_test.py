@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import itertools
+
+import pytest
+import torch
+import torch.nn as nn
+from deepctr_torch.layers import BilinearInteraction
+
+FIELD_SIZE = 4
+EMBEDDING_SIZE = 3
+
+
+def bilinear_reference(layer, inputs):
+    fields = torch.split(inputs, 1, dim=1)
+    pairs = list(itertools.combinations(range(len(fields)), 2))
+    if layer.bilinear_type == "all":
+        p = [torch.mul(layer.bilinear(fields[i]), fields[j]) for i, j in pairs]
+    elif layer.bilinear_type == "each":
+        p = [torch.mul(torch.matmul(fields[i], layer.weight[i].t()), fields[j]) for i, j in pairs]
+    else:
+        p = [torch.mul(torch.matmul(fields[i], layer.weight[k].t()), fields[j]) for k, (i, j) in enumerate(pairs)]
+    return torch.cat(p, dim=1)
+
+
+@pytest.mark.parametrize(
+    'bilinear_type',
+    ["all", "each", "interaction"]
+)
+def test_BilinearInteraction(bilinear_type):
+    layer = BilinearInteraction(FIELD_SIZE, EMBEDDING_SIZE, bilinear_type)
+    inputs = torch.randn(5, FIELD_SIZE, EMBEDDING_SIZE)
+
+    output = layer(inputs)
+    assert output.shape == (5, FIELD_SIZE * (FIELD_SIZE - 1) // 2, EMBEDDING_SIZE)
+    assert output.is_contiguous()
+    assert torch.allclose(output, bilinear_reference(layer, inputs), atol=1e-6)
+
+
+@pytest.mark.parametrize(
+    'bilinear_type',
+    ["each", "interaction"]
+)
+def test_BilinearInteraction_load_per_pair_weights(bilinear_type):
+    layer = BilinearInteraction(FIELD_SIZE, EMBEDDING_SIZE, bilinear_type)
+    old_weights = [nn.Linear(EMBEDDING_SIZE, EMBEDDING_SIZE, bias=False).weight.detach()
+                   for _ in range(layer.weight.shape[0])]
+
+    layer.load_state_dict({'bilinear.%d.weight' % i: w for i, w in enumerate(old_weights)})
+    assert torch.equal(layer.weight.detach(), torch.stack(old_weights))
+
+
+if __name__ == "__main__":
+    pass
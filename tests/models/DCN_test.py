@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
+import numpy as np
 import pytest
 import sys
+import torch
 from deepctr_torch.models import DCN
 from ..utils import check_model, get_test_data, SAMPLE_SIZE
 
@@ -22,5 +24,35 @@ def test_DCN(embedding_size, cross_num, hidden_size, sparse_feature_num):
     check_model(model, model_name, x, y)
 
 
+def test_DCN_fuse_bn():
+    x, y, feature_columns = get_test_data(SAMPLE_SIZE, 2, 2)
+
+    model = DCN(feature_columns, cross_num=1, dnn_hidden_units=(8, 8), dnn_use_bn=True)
+    # update the BatchNorm running statistics before folding them
+    model.train()
+    model(torch.from_numpy(np.stack(x, axis=1)).float())
+
+    pred = model.predict(x)
+    model.dnn.fuse_bn()
+    assert not model.dnn.use_bn
+    assert np.allclose(model.predict(x), pred, atol=1e-6)
+
+
+def test_DCN_load_per_layer_cross_weights():
+    x, y, feature_columns = get_test_data(SAMPLE_SIZE, 2, 2)
+    model = DCN(feature_columns, cross_num=2, dnn_hidden_units=(8,), init_std=0.1)
+
+    # state dict layout from before the cross layers were stacked
+    state_dict = model.state_dict()
+    for i, (kernel, bias) in enumerate(zip(state_dict.pop('crossnet.weight'), state_dict.pop('crossnet.bias'))):
+        state_dict['crossnet.kernels.%d' % i] = kernel.unsqueeze(1)
+        state_dict['crossnet.bias.%d' % i] = bias.unsqueeze(1)
+
+    new_model = DCN(feature_columns, cross_num=2, dnn_hidden_units=(8,), init_std=0.1)
+    new_model.load_state_dict(state_dict)
+    assert torch.equal(new_model.crossnet.weight, model.crossnet.weight)
+    assert np.allclose(new_model.predict(x), model.predict(x))
+
+
 if __name__ == "__main__":
     pass
\ No newline at end of file
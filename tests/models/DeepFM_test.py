@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
+import numpy as np
 import pytest
 import sys
+import torch
 from deepctr_torch.models import DeepFM
 from ..utils import get_test_data, SAMPLE_SIZE, check_model
 
@@ -23,5 +25,23 @@ def test_DeepFM(use_fm, hidden_size, sparse_feature_num):
     check_model(model, model_name, x, y)
 
 
+def test_DeepFM_load_per_table_embeddings():
+    x, y, feature_columns = get_test_data(SAMPLE_SIZE, 3, 3)
+    model = DeepFM(feature_columns, feature_columns, dnn_hidden_units=(8,), init_std=0.1)
+
+    # state dict layout from before the embedding tables were fused
+    state_dict = model.state_dict()
+    for prefix, embedding in (('embedding_dict.', model.embedding_dict),
+                              ('linear_model.embedding_dict.', model.linear_model.embedding_dict)):
+        tables = torch.split(state_dict.pop(prefix + 'weight'), embedding.table_sizes)
+        for name, table in zip(embedding.table_names, tables):
+            state_dict[prefix + name + '.weight'] = table
+
+    new_model = DeepFM(feature_columns, feature_columns, dnn_hidden_units=(8,), init_std=0.1)
+    assert not np.allclose(new_model.predict(x), model.predict(x))
+    new_model.load_state_dict(state_dict)
+    assert np.allclose(new_model.predict(x), model.predict(x))
+
+
 if __name__ == "__main__":
     pass
\ No newline at end of file
@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
+import numpy as np
 import pytest
 import sys
+import torch
 from deepctr_torch.models import FiBiNET
+from deepctr_torch.models.basemodel import FusedEmbedding
 from ..utils import check_model, SAMPLE_SIZE, get_test_data
 
 
@@ -20,5 +23,16 @@ def test_FiBiNET(bilinear_type):
     check_model(model, model_name, x, y)
 
 
+@pytest.mark.skipif(not FusedEmbedding.int8_supported(), reason="quantized embedding ops are not available")
+def test_FiBiNET_int8_embedding():
+    x, y, feature_columns = get_test_data(SAMPLE_SIZE, 3, 3)
+    model = FiBiNET(feature_columns, feature_columns, dnn_hidden_units=[8, 8], init_std=0.1)
+
+    pred = model.predict(x)
+    model.embedding_dict.to_int8()
+    assert model.embedding_dict.packed_weight.dtype == torch.uint8
+    assert np.allclose(model.predict(x), pred, atol=1e-2)
+
+
 if __name__ == "__main__":
     pass
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
+import numpy as np
 import pytest
 import sys
+import torch
 import torch.nn.functional as F
 from deepctr_torch.models import xDeepFM
 from ..utils import get_test_data, SAMPLE_SIZE, check_model
@@ -25,5 +27,25 @@ def test_xDeepFM(dnn_hidden_units, cin_layer_size, cin_split_half, cin_activatio
     check_model(model, model_name, x, y)
 
 
+@pytest.mark.skipif(not hasattr(torch, 'autocast'), reason="bfloat16 inference requires torch.autocast")
+def test_xDeepFM_bf16_inference():
+    x, y, feature_columns = get_test_data(SAMPLE_SIZE, 2, 2)
+    model = xDeepFM(feature_columns, feature_columns, dnn_hidden_units=(8,), cin_layer_size=(8,), dnn_use_bn=True)
+
+    pred = model.predict(x)
+    model.to_bf16_inference()
+    assert model.dnn.linears[0].weight.dtype == torch.bfloat16
+    assert model.embedding_dict.weight.dtype == torch.float32
+    bf16_pred = model.predict(x)
+    assert bf16_pred.dtype == np.float32
+    assert np.allclose(bf16_pred, pred, atol=1e-2)
+
+    X = torch.from_numpy(np.hstack([np.expand_dims(v, axis=1) for v in x])).float()
+    with torch.no_grad():
+        out = model(X)
+    assert out.dtype == torch.float32
+    assert np.allclose(out.numpy(), pred, atol=1e-2)
+
+
 if __name__ == '__main__':
     pass
\ No newline at end of file